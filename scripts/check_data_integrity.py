@@ -4,10 +4,13 @@ Check IntelliChat data integrity
 Run this to diagnose data-related issues
 """
 
+import argparse
+import os
 import sqlite3
 import sys
+import time
+from contextlib import closing
 from pathlib import Path
-from datetime import datetime
 
 # Colors for terminal output
 class Colors:
@@ -23,6 +26,13 @@ CONVERSATIONS_DIR = DATA_DIR / "conversations"
 LOGS_DIR = DATA_DIR / "logs"
 DB_PATH = CONVERSATIONS_DIR / "conversations.db"
 
+def connect_readonly():
+    """
+    Open the database read-only so the checks never take write locks
+    or contend with a running IntelliChat writer
+    """
+    return sqlite3.connect(f"{DB_PATH.as_uri()}?mode=ro", uri=True)
+
 def print_header(text):
     """Print section header"""
     print(f"\n{Colors.BLUE}{'='*60}")
@@ -79,46 +89,55 @@ def check_database():
     
     # Check if database can be opened
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Check tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [row[0] for row in cursor.fetchall()]
-        
-        required_tables = ['conversations', 'messages', 'model_usage']
-        
-        print("\n  Tables:")
-        for table in required_tables:
-            if table in tables:
-                print_success(f"  {table}")
-                
-                # Count rows
-                cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                count = cursor.fetchone()[0]
-                print(f"    Rows: {count}")
-            else:
-                print_error(f"  {table} (missing)")
-        
-        # Check indexes
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
-        indexes = [row[0] for row in cursor.fetchall()]
-        
-        print(f"\n  Indexes: {len(indexes)}")
-        for idx in indexes:
-            if not idx.startswith('sqlite_'):  # Skip auto-created indexes
+        with closing(connect_readonly()) as conn:
+            cursor = conn.cursor()
+            
+            # Check tables
+            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            tables = {row[0] for row in cursor}
+            
+            required_tables = ['conversations', 'messages', 'model_usage']
+            
+            # Row counts from the AUTOINCREMENT counters (avoids a full table scan)
+            row_counts = {}
+            if 'sqlite_sequence' in tables:
+                cursor.execute("SELECT name, seq FROM sqlite_sequence")
+                row_counts = dict(cursor.fetchall())
+            
+            print("\n  Tables:")
+            for table in required_tables:
+                if table in tables:
+                    print_success(f"  {table}")
+                    print(f"    Rows: ~{row_counts.get(table, 0)}")
+                else:
+                    print_error(f"  {table} (missing)")
+            
+            # Check indexes, skipping auto-created sqlite_* indexes
+            cursor.execute(r"""
+                SELECT name FROM sqlite_master
+                WHERE type='index' AND name NOT LIKE 'sqlite\_%' ESCAPE '\'
+            """)
+            indexes = [row[0] for row in cursor]
+            
+            print(f"\n  Indexes: {len(indexes)}")
+            for idx in indexes:
                 print(f"    - {idx}")
-        
-        conn.close()
-        print_success("Database structure is valid")
-        return True
+            
+            print_success("Database structure is valid")
+            return True
         
     except sqlite3.Error as e:
         print_error(f"Database error: {e}")
         return False
 
-def check_database_integrity():
-    """Run SQLite integrity check"""
+def check_database_integrity(deep=False):
+    """
+    Run SQLite integrity check
+    
+    Args:
+        deep: Run the full integrity_check (also verifies every index
+            entry) instead of the faster quick_check
+    """
     print_header("Database Integrity Check")
     
     if not DB_PATH.exists():
@@ -126,35 +145,54 @@ def check_database_integrity():
         return False
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("PRAGMA integrity_check")
-        result = cursor.fetchone()[0]
-        
-        if result == "ok":
-            print_success("Database integrity: OK")
-            conn.close()
-            return True
-        else:
-            print_error(f"Database integrity issues: {result}")
-            conn.close()
-            return False
+        with closing(connect_readonly()) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("PRAGMA integrity_check" if deep else "PRAGMA quick_check")
+            result = cursor.fetchone()[0]
+            
+            if result == "ok":
+                print_success("Database integrity: OK")
+                return True
+            else:
+                print_error(f"Database integrity issues: {result}")
+                return False
             
     except sqlite3.Error as e:
         print_error(f"Integrity check failed: {e}")
         return False
 
-def check_logs():
+def scan_logs():
+    """
+    Stat the *.log files in the logs directory in a single directory pass
+    
+    Rotated backups (*.log.N) are skipped without a stat() call.
+    
+    Returns:
+        dict: File name -> os.stat_result (empty if the directory is missing)
+    """
+    try:
+        with os.scandir(LOGS_DIR) as entries:
+            return {
+                entry.name: entry.stat()
+                for entry in entries
+                if entry.name.endswith(".log") and entry.is_file()
+            }
+    except FileNotFoundError:
+        return {}
+
+def check_logs(log_stats=None):
     """Check log files"""
     print_header("Checking Log Files")
     
+    if log_stats is None:
+        log_stats = scan_logs()
+    
     log_files = ["app.log", "error.log", "api.log"]
     
     for log_file in log_files:
-        log_path = LOGS_DIR / log_file
-        if log_path.exists():
-            size = log_path.stat().st_size
+        if log_file in log_stats:
+            size = log_stats[log_file].st_size
             size_mb = size / (1024 * 1024)
             
             if size_mb > 100:
@@ -176,61 +214,66 @@ def get_statistics():
         return
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Total conversations
-        cursor.execute("SELECT COUNT(*) FROM conversations")
-        total_conversations = cursor.fetchone()[0]
-        print(f"Total Conversations: {total_conversations}")
-        
-        # Total messages
-        cursor.execute("SELECT COUNT(*) FROM messages")
-        total_messages = cursor.fetchone()[0]
-        print(f"Total Messages: {total_messages}")
-        
-        # Messages by role
-        cursor.execute("""
-            SELECT role, COUNT(*) 
-            FROM messages 
-            GROUP BY role
-        """)
-        print("\nMessages by Role:")
-        for role, count in cursor.fetchall():
-            print(f"  {role}: {count}")
-        
-        # Total tokens
-        cursor.execute("SELECT SUM(token_count) FROM messages WHERE token_count IS NOT NULL")
-        total_tokens = cursor.fetchone()[0] or 0
-        print(f"\nTotal Tokens Used: {total_tokens:,}")
-        
-        # Model usage
-        cursor.execute("""
-            SELECT model_name, COUNT(*) as usage_count
-            FROM conversations
-            GROUP BY model_name
-            ORDER BY usage_count DESC
-        """)
-        print("\nModel Usage:")
-        for model, count in cursor.fetchall():
-            print(f"  {model}: {count} conversations")
-        
-        # Date range
-        cursor.execute("SELECT MIN(created_at), MAX(created_at) FROM conversations")
-        min_date, max_date = cursor.fetchone()
-        if min_date and max_date:
-            print(f"\nFirst Conversation: {min_date}")
-            print(f"Last Conversation: {max_date}")
-        
-        conn.close()
+        with closing(connect_readonly()) as conn:
+            cursor = conn.cursor()
+            
+            # One pass over each table; overall totals are rolled up from
+            # the groups (SQLite has no GROUPING SETS)
+            cursor.execute("""
+                SELECT role, COUNT(*), COALESCE(SUM(token_count), 0)
+                FROM messages
+                GROUP BY role
+            """)
+            roles = cursor.fetchall()
+            
+            cursor.execute("""
+                SELECT model_name, COUNT(*) as usage_count,
+                       MIN(created_at), MAX(created_at)
+                FROM conversations
+                GROUP BY model_name
+                ORDER BY usage_count DESC
+            """)
+            models = cursor.fetchall()
+            
+            # Total conversations
+            total_conversations = sum(row[1] for row in models)
+            print(f"Total Conversations: {total_conversations}")
+            
+            # Total messages
+            total_messages = sum(row[1] for row in roles)
+            print(f"Total Messages: {total_messages}")
+            
+            # Messages by role
+            print("\nMessages by Role:")
+            for role, count, _ in roles:
+                print(f"  {role}: {count}")
+            
+            # Total tokens
+            total_tokens = sum(row[2] for row in roles)
+            print(f"\nTotal Tokens Used: {total_tokens:,}")
+            
+            # Model usage
+            print("\nModel Usage:")
+            for model, count, _, _ in models:
+                print(f"  {model}: {count} conversations")
+            
+            # Date range
+            min_date = min((row[2] for row in models if row[2] is not None), default=None)
+            max_date = max((row[3] for row in models if row[3] is not None), default=None)
+            if min_date and max_date:
+                print(f"\nFirst Conversation: {min_date}")
+                print(f"Last Conversation: {max_date}")
         
     except sqlite3.Error as e:
         print_error(f"Error getting statistics: {e}")
 
-def suggest_maintenance():
+def suggest_maintenance(log_stats=None):
     """Suggest maintenance actions"""
     print_header("Maintenance Suggestions")
     
+    if log_stats is None:
+        log_stats = scan_logs()
+    
     suggestions = []
     
     # Check database size
@@ -244,11 +287,11 @@ def suggest_maintenance():
             )
     
     # Check log sizes
-    for log_file in LOGS_DIR.glob("*.log"):
-        size_mb = log_file.stat().st_size / (1024 * 1024)
+    for name, stat in log_stats.items():
+        size_mb = stat.st_size / (1024 * 1024)
         if size_mb > 50:
             suggestions.append(
-                f"{log_file.name} is large (>50MB). Consider:\n"
+                f"{name} is large (>50MB). Consider:\n"
                 "  - Archive: python scripts/archive_logs.py\n"
                 "  - Rotate logs"
             )
@@ -261,21 +304,34 @@ def suggest_maintenance():
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Check IntelliChat data integrity")
+    parser.add_argument(
+        "--deep",
+        action="store_true",
+        help="run the full PRAGMA integrity_check instead of quick_check"
+    )
+    args = parser.parse_args()
+    
+    # Buffer output and write it out in blocks instead of flushing every line
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(line_buffering=False)
+    
     print(f"\n{Colors.BLUE}{'='*60}")
     print("IntelliChat Data Integrity Check")
     print(f"{'='*60}{Colors.RESET}")
-    print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Timestamp: {time.strftime('%Y-%m-%d %H:%M:%S')}")
     
     # Run all checks
     checks = [
         check_directories(),
         check_database(),
-        check_database_integrity(),
+        check_database_integrity(deep=args.deep),
     ]
     
-    check_logs()
+    log_stats = scan_logs()
+    check_logs(log_stats)
     get_statistics()
-    suggest_maintenance()
+    suggest_maintenance(log_stats)
     
     # Summary
     print_header("Summary")
@@ -293,4 +349,6 @@ def main():
         return 1
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    status = main()
+    sys.stdout.flush()
+    sys.exit(status)
\ No newline at end of file
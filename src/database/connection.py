@@ -3,7 +3,12 @@ Database connection and initialization
 Automatically creates database and tables if they don't exist
 """
 
+import atexit
+import os
+import queue
 import sqlite3
+from datetime import datetime, timezone
+from itertools import islice
 from pathlib import Path
 from contextlib import contextmanager
 import logging
@@ -17,20 +22,149 @@ DATA_DIR = PROJECT_ROOT / "data"
 CONVERSATIONS_DIR = DATA_DIR / "conversations"
 DB_PATH = CONVERSATIONS_DIR / "conversations.db"
 
+# Per-connection tuning, applied every time a connection is opened
+CONNECTION_PRAGMAS = """
+    PRAGMA synchronous = NORMAL;
+    PRAGMA cache_size = -20000;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA foreign_keys = ON;
+"""
+
+# Bump when SCHEMA_SQL changes so existing databases pick up the new DDL
+SCHEMA_VERSION = 2
+
+SCHEMA_SQL = f"""
+    -- Persistent settings, stored in the database file.
+    -- auto_vacuum only takes effect before the first table is created.
+    PRAGMA auto_vacuum = INCREMENTAL;
+    PRAGMA journal_mode = WAL;
+    
+    BEGIN;
+    
+    -- Create conversations table
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL UNIQUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        title TEXT,
+        model_name TEXT NOT NULL
+    );
+    
+    -- Create messages table
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id INTEGER NOT NULL,
+        role TEXT NOT NULL CHECK(role IN ('user', 'assistant', 'system')),
+        content TEXT NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        token_count INTEGER,
+        FOREIGN KEY (conversation_id) 
+            REFERENCES conversations(id) 
+            ON DELETE CASCADE
+    );
+    
+    -- Create model_usage table
+    CREATE TABLE IF NOT EXISTS model_usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        model_name TEXT NOT NULL,
+        tokens_used INTEGER NOT NULL,
+        response_time REAL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    -- Create indexes for better performance
+    CREATE INDEX IF NOT EXISTS idx_messages_conversation 
+    ON messages(conversation_id);
+    
+    CREATE INDEX IF NOT EXISTS idx_conversations_session 
+    ON conversations(session_id);
+    
+    CREATE INDEX IF NOT EXISTS idx_messages_timestamp 
+    ON messages(timestamp DESC);
+    
+    CREATE INDEX IF NOT EXISTS idx_model_usage_timestamp 
+    ON model_usage(timestamp DESC);
+    
+    -- Covering indexes so the statistics aggregates avoid full table scans
+    CREATE INDEX IF NOT EXISTS idx_messages_role_tokens 
+    ON messages(role, token_count);
+    
+    CREATE INDEX IF NOT EXISTS idx_conversations_model 
+    ON conversations(model_name, created_at);
+    
+    -- conversations.updated_at is set by the application, once per
+    -- request instead of once per inserted row
+    DROP TRIGGER IF EXISTS update_conversation_timestamp;
+    
+    PRAGMA user_version = {SCHEMA_VERSION};
+    
+    COMMIT;
+"""
+
+# Size of sqlite3's per-connection prepared statement cache
+CACHED_STATEMENTS = 256
+
+# Statistics queries, kept constant so the statement cache can reuse them
+# Message count and token sum come from a single scan of messages
+STATS_TOTALS_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM conversations),
+        COUNT(*),
+        COALESCE(SUM(token_count), 0)
+    FROM messages
+"""
+# Conversation and message counts read from the AUTOINCREMENT counters
+# (upper bounds, no COUNT(*)); the token total still scans messages
+STATS_FAST_TOTALS_SQL = """
+    SELECT
+        (SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'conversations'),
+        (SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'messages'),
+        (SELECT COALESCE(SUM(token_count), 0) FROM messages)
+"""
+# Batched message writes
+INSERT_MESSAGE_SQL = """
+    INSERT INTO messages (conversation_id, role, content, token_count)
+    VALUES (?, ?, ?, ?)
+"""
+TOUCH_CONVERSATION_SQL = "UPDATE conversations SET updated_at = ? WHERE id = ?"
+# Rows handed to each executemany() call; only bounds the memory used when
+# rows is a large iterator (executemany binds one row per statement)
+MESSAGE_BATCH_SIZE = 5000
+
+STATS_SIZE_SQL = "SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()"
+
+def _utc_timestamp():
+    """Current UTC time in SQLite's CURRENT_TIMESTAMP format"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
 class DatabaseManager:
     """Manages database connections and initialization"""
     
-    def __init__(self, db_path=None):
+    # Data directories only need to be created once per process
+    _dirs_ensured = False
+    
+    def __init__(self, db_path=None, pool_size=None):
         """Initialize database manager"""
         self.db_path = db_path or DB_PATH
+        # Idle connections ready for reuse; PRAGMAs are applied once per connection
+        self._pool = queue.Queue(maxsize=pool_size or os.cpu_count() or 4)
+        # Process that owns the pooled connections (they must not cross fork())
+        self._pid = os.getpid()
+        self._inherited = []
         self._ensure_directories()
         self._initialize_database()
     
     def _ensure_directories(self):
         """Create data directories if they don't exist"""
+        if DatabaseManager._dirs_ensured:
+            return
+        
         DATA_DIR.mkdir(exist_ok=True)
         CONVERSATIONS_DIR.mkdir(exist_ok=True)
         (DATA_DIR / "logs").mkdir(exist_ok=True)
+        DatabaseManager._dirs_ensured = True
         
         logger.info(f"Data directories ensured at {DATA_DIR}")
     
@@ -40,104 +174,95 @@ class DatabaseManager:
             logger.info(f"Creating new database at {self.db_path}")
         
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Create conversations table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL UNIQUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    title TEXT,
-                    model_name TEXT NOT NULL
-                )
-            """)
-            
-            # Create messages table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    conversation_id INTEGER NOT NULL,
-                    role TEXT NOT NULL CHECK(role IN ('user', 'assistant', 'system')),
-                    content TEXT NOT NULL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    token_count INTEGER,
-                    FOREIGN KEY (conversation_id) 
-                        REFERENCES conversations(id) 
-                        ON DELETE CASCADE
-                )
-            """)
-            
-            # Create model_usage table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS model_usage (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    model_name TEXT NOT NULL,
-                    tokens_used INTEGER NOT NULL,
-                    response_time REAL,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create indexes for better performance
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_messages_conversation 
-                ON messages(conversation_id)
-            """)
-            
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_conversations_session 
-                ON conversations(session_id)
-            """)
-            
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_messages_timestamp 
-                ON messages(timestamp DESC)
-            """)
-            
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_model_usage_timestamp 
-                ON model_usage(timestamp DESC)
-            """)
-            
-            # Create trigger to update updated_at on conversations
-            cursor.execute("""
-                CREATE TRIGGER IF NOT EXISTS update_conversation_timestamp 
-                AFTER INSERT ON messages
-                BEGIN
-                    UPDATE conversations 
-                    SET updated_at = CURRENT_TIMESTAMP
-                    WHERE id = NEW.conversation_id;
-                END
-            """)
+            # Skip the DDL on warm starts once the schema is current
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return
             
-            conn.commit()
+            conn.executescript(SCHEMA_SQL)
             logger.info("Database initialized successfully")
     
-    @contextmanager
-    def get_connection(self):
-        """Context manager for database connections"""
+    def _connect(self):
+        """Open a new tuned database connection"""
         conn = sqlite3.connect(
             self.db_path,
             check_same_thread=False,
-            timeout=10.0
+            timeout=10.0,
+            cached_statements=CACHED_STATEMENTS
         )
-        conn.row_factory = sqlite3.Row  # Enable column access by name
+        conn.executescript(CONNECTION_PRAGMAS)
+        return conn
+    
+    def _check_fork(self):
+        """
+        Start a fresh pool if this process was forked since the pool was
+        filled. Inherited handles are never reused, and are kept referenced
+        rather than closed, since closing them in the child could checkpoint
+        the WAL underneath the parent.
+        """
+        if self._pid != os.getpid():
+            self._inherited.append(self._pool)
+            self._pool = queue.Queue(maxsize=self._pool.maxsize)
+            self._pid = os.getpid()
+    
+    def _acquire(self):
+        """Borrow a connection from the pool, opening one if none is idle"""
+        self._check_fork()
+        
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+    
+    def _release(self, conn):
+        """Return a connection to the pool, closing it if the pool is full"""
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+    
+    @contextmanager
+    def get_connection(self, by_name=False):
+        """
+        Context manager for pooled database connections
+        
+        Args:
+            by_name: Return sqlite3.Row rows (column access by name)
+                instead of plain tuples
+        """
+        conn = self._acquire()
+        conn.row_factory = sqlite3.Row if by_name else None
         
         try:
             yield conn
             conn.commit()
         except Exception as e:
-            conn.rollback()
             logger.error(f"Database error: {e}")
             raise
         finally:
-            conn.close()
+            # Roll back whatever is still open, including after GeneratorExit
+            # or KeyboardInterrupt, so no transaction is handed to the next borrower
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                # State is unknown after a failed rollback, don't pool it
+                conn.close()
+            else:
+                self._release(conn)
     
-    def execute_query(self, query, params=None):
+    def close(self):
+        """Close all idle pooled connections"""
+        self._check_fork()
+        
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+    
+    def execute_query(self, query, params=None, by_name=False):
         """Execute a query and return results"""
-        with self.get_connection() as conn:
+        with self.get_connection(by_name=by_name) as conn:
             cursor = conn.cursor()
             if params:
                 cursor.execute(query, params)
@@ -152,9 +277,61 @@ class DatabaseManager:
             cursor.executemany(query, params_list)
             conn.commit()
     
+    def insert_messages(self, conversation_id, rows):
+        """
+        Insert messages for a conversation in a single write transaction
+        
+        Args:
+            conversation_id: ID of the conversation the messages belong to
+            rows: Iterable of (role, content, token_count) tuples
+        
+        Returns:
+            int: Number of messages inserted
+        """
+        rows = iter(rows)
+        
+        def next_batch():
+            return [
+                (conversation_id, role, content, token_count)
+                for role, content, token_count in islice(rows, MESSAGE_BATCH_SIZE)
+            ]
+        
+        # Nothing to write: don't take the write lock for an empty commit
+        batch = next_batch()
+        if not batch:
+            return 0
+        
+        inserted = 0
+        with self.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            
+            while batch:
+                cursor.executemany(INSERT_MESSAGE_SQL, batch)
+                inserted += len(batch)
+                batch = next_batch()
+            
+            cursor.execute(TOUCH_CONVERSATION_SQL, (_utc_timestamp(), conversation_id))
+        
+        return inserted
+    
+    def touch_conversation(self, conversation_id, updated_at=None):
+        """
+        Set a conversation's updated_at, once per request
+        
+        Args:
+            conversation_id: ID of the conversation to update
+            updated_at: Timestamp to store (default: current UTC time)
+        """
+        with self.get_connection() as conn:
+            conn.execute(
+                TOUCH_CONVERSATION_SQL,
+                (updated_at or _utc_timestamp(), conversation_id)
+            )
+    
     def get_table_info(self, table_name):
         """Get information about a table"""
-        with self.get_connection() as conn:
+        with self.get_connection(by_name=True) as conn:
             cursor = conn.cursor()
             cursor.execute(f"PRAGMA table_info({table_name})")
             return cursor.fetchall()
@@ -166,35 +343,44 @@ class DatabaseManager:
             conn.execute("VACUUM")
         logger.info("VACUUM completed")
     
-    def check_integrity(self):
-        """Check database integrity"""
+    def check_integrity(self, deep=False):
+        """
+        Check database integrity
+        
+        Args:
+            deep: Run the full integrity_check instead of quick_check
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("PRAGMA integrity_check")
+            cursor.execute("PRAGMA integrity_check" if deep else "PRAGMA quick_check")
             result = cursor.fetchone()[0]
             return result == "ok"
     
-    def get_statistics(self):
-        """Get database statistics"""
+    def get_statistics(self, fast=False):
+        """
+        Get database statistics
+        
+        Args:
+            fast: Read the conversation and message totals from the
+                AUTOINCREMENT counters in sqlite_sequence instead of
+                counting rows; these over-count deleted rows. The token
+                total is still computed by scanning messages.
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
             stats = {}
             
-            # Total conversations
-            cursor.execute("SELECT COUNT(*) FROM conversations")
-            stats['total_conversations'] = cursor.fetchone()[0]
-            
-            # Total messages
-            cursor.execute("SELECT COUNT(*) FROM messages")
-            stats['total_messages'] = cursor.fetchone()[0]
-            
-            # Total tokens
-            cursor.execute("SELECT COALESCE(SUM(token_count), 0) FROM messages")
-            stats['total_tokens'] = cursor.fetchone()[0]
+            # Total conversations, messages and tokens
+            cursor.execute(STATS_FAST_TOTALS_SQL if fast else STATS_TOTALS_SQL)
+            (
+                stats['total_conversations'],
+                stats['total_messages'],
+                stats['total_tokens'],
+            ) = cursor.fetchone()
             
             # Database size
-            cursor.execute("SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()")
+            cursor.execute(STATS_SIZE_SQL)
             stats['db_size_bytes'] = cursor.fetchone()[0]
             stats['db_size_mb'] = stats['db_size_bytes'] / (1024 * 1024)
             
@@ -202,19 +388,20 @@ class DatabaseManager:
 
 # Global database manager instance
 db_manager = DatabaseManager()
+atexit.register(db_manager.close)
 
 def get_db():
     """Get database manager instance"""
     return db_manager
 
 # Convenience functions
-def get_connection():
+def get_connection(by_name=False):
     """Get database connection (context manager)"""
-    return db_manager.get_connection()
+    return db_manager.get_connection(by_name=by_name)
 
-def execute_query(query, params=None):
+def execute_query(query, params=None, by_name=False):
     """Execute a query"""
-    return db_manager.execute_query(query, params)
+    return db_manager.execute_query(query, params, by_name=by_name)
 
 def initialize_database():
     """Initialize database (called automatically)"""
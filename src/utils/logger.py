@@ -3,18 +3,21 @@ Logging configuration for IntelliChat
 Automatically creates log files on first use
 """
 
+import atexit
 import logging
+import os
+import queue
 import sys
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
-from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # Paths
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 LOGS_DIR = PROJECT_ROOT / "data" / "logs"
 
 # Create logs directory if it doesn't exist
-LOGS_DIR.mkdir(parents=True, exist_ok=True)
+if not LOGS_DIR.is_dir():
+    LOGS_DIR.mkdir(parents=True, exist_ok=True)
 
 # Log file paths
 APP_LOG = LOGS_DIR / "app.log"
@@ -25,6 +28,58 @@ API_LOG = LOGS_DIR / "api.log"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+# Background listeners doing the handler I/O, keyed by logger name
+_listeners = {}
+
+def _start_listener(queue_handler, *handlers):
+    """Give a QueueHandler a fresh queue and start a listener draining it"""
+    log_queue = queue.Queue(-1)
+    queue_handler.queue = log_queue
+    
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+def _attach_queued_handlers(logger, *handlers):
+    """
+    Route a logger's records through a queue so that handler I/O runs on
+    a background thread instead of the caller's thread
+    
+    Args:
+        logger: Logger to attach the queue to
+        *handlers: Handlers that perform the actual output
+    """
+    # Stop the listener of a previous setup of this logger
+    previous = _listeners.pop(logger.name, None)
+    if previous:
+        previous.stop()
+    
+    queue_handler = QueueHandler(None)
+    logger.addHandler(queue_handler)
+    _listeners[logger.name] = _start_listener(queue_handler, *handlers)
+
+def _restart_listeners_after_fork():
+    """
+    Listener threads do not survive fork(); start new ones in the child.
+    Records still queued at fork time belong to the parent and are dropped.
+    """
+    for name, listener in _listeners.items():
+        queue_handler = next(
+            h for h in logging.getLogger(name).handlers
+            if isinstance(h, QueueHandler)
+        )
+        _listeners[name] = _start_listener(queue_handler, *listener.handlers)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listeners_after_fork)
+
+@atexit.register
+def _stop_listeners():
+    """Flush pending records and stop all listeners"""
+    for listener in _listeners.values():
+        listener.stop()
+    _listeners.clear()
+
 def setup_logger(
     name,
     log_file,
@@ -51,6 +106,7 @@ def setup_logger(
     
     # Clear any existing handlers
     logger.handlers.clear()
+    logger.propagate = False
     
     # Create formatters
     formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
@@ -71,8 +127,7 @@ def setup_logger(
     console_handler.setFormatter(formatter)
     
     # Add handlers
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    _attach_queued_handlers(logger, file_handler, console_handler)
     
     return logger
 
@@ -99,7 +154,7 @@ def setup_error_logger():
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(formatter)
     
-    error_logger.addHandler(error_handler)
+    _attach_queued_handlers(error_logger, error_handler)
     
     return error_logger
 
@@ -110,6 +165,7 @@ def setup_api_logger():
     
     # Clear existing handlers
     api_logger.handlers.clear()
+    api_logger.propagate = False
     
     formatter = logging.Formatter(
         "%(asctime)s - %(levelname)s - %(message)s",
@@ -126,7 +182,7 @@ def setup_api_logger():
     api_handler.setLevel(logging.INFO)
     api_handler.setFormatter(formatter)
     
-    api_logger.addHandler(api_handler)
+    _attach_queued_handlers(api_logger, api_handler)
     
     return api_logger
 
@@ -156,7 +212,7 @@ def log_exception(exc):
     Args:
         exc: Exception object
     """
-    error_logger.exception(f"Exception occurred: {exc}")
+    error_logger.error("Exception occurred: %s", exc, exc_info=exc)
 
 def log_api_request(method, endpoint, status_code, response_time):
     """
@@ -169,7 +225,7 @@ def log_api_request(method, endpoint, status_code, response_time):
         response_time: Response time in milliseconds
     """
     api_logger.info(
-        f"{method} {endpoint} - {status_code} - {response_time:.2f}ms"
+        "%s %s - %s - %.2fms", method, endpoint, status_code, response_time
     )
 
 # Log startup message
@@ -177,7 +233,6 @@ def log_startup():
     """Log application startup"""
     app_logger.info("="*60)
     app_logger.info("IntelliChat Starting")
-    app_logger.info(f"Timestamp: {datetime.now().isoformat()}")
     app_logger.info(f"Logs Directory: {LOGS_DIR}")
     app_logger.info("="*60)
 